@@ -7,98 +7,191 @@ with the actual Claude output from the tmux session.
 """
 
 import os
+import re
 import sys
-import requests
+import json
+import time
 import subprocess
+import threading
+import http.client
+from collections import deque
 from pathlib import Path
-from urllib.parse import quote
-from utils import load_config, strip_decorative_lines, save_claude_instance
+from urllib.parse import quote, urlencode
+from utils import load_config_cached, update_state
 
 
-def get_tmux_context():
-    """Get the current tmux session and pane from environment."""
-    tmux_pane = os.environ.get("TMUX_PANE")
-    if not tmux_pane:
-        return None, None, None
+_API_HOST = "api.pushover.net"
 
-    try:
-        # Get session name
-        session = subprocess.run(
-            ["tmux", "display-message", "-p", "-t", tmux_pane, "#S"],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout.strip()
-
-        # Get window name
-        window = subprocess.run(
-            ["tmux", "display-message", "-p", "-t", tmux_pane, "#W"],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout.strip()
-
-        return session, window, tmux_pane
-    except subprocess.CalledProcessError:
-        return None, None, None
+# Bounded retries so Pushover's rate limiting (429) can't block the
+# hook for more than a couple of seconds
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+_RETRY_TOTAL = 2
+_RETRY_BACKOFF = 0.2  # seconds, doubled per attempt
 
+# Connection opened by the warmup thread so the TLS handshake overlaps
+# the tmux work in main()
+_conn = None
 
-def get_tmux_output(pane, num_lines=15):
-    """Capture output from the specific tmux pane."""
-    try:
-        result = subprocess.run(
-            ["tmux", "capture-pane", "-p", "-t", pane, "-S", f"-{num_lines}"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        # Strip decorative lines for cleaner notifications
-        return strip_decorative_lines(result.stdout).strip()
-    except subprocess.CalledProcessError:
-        return None
+# Compiled once at import: the capture is cleaned on every hook
+_NONPRINT_RE = re.compile(r"[^\x20-\x7e\n\r\t]")  # keep ASCII printable + newlines/tabs
+# Decorative-only lines are detected per streamed line with a hashed
+# frozenset superset test - one C call, no regex state machine
+_DECOR_CHARS = frozenset(" \t-_=~*#")
 
+# Sentinel line separating metadata from pane output in get_tmux_snapshot()
+_SNAPSHOT_SEP = "---CLAUDE-REMOTE-UI-SEP---"
 
-def extract_relevant_context(output, max_lines=10):
-    """Extract the most relevant lines from tmux output."""
-    if not output:
-        return "Claude Code activity detected"
+# Session/window metadata cache: Claude fires Notification and Stop hooks
+# back-to-back in the same pane, so reuse a recent lookup instead of
+# asking tmux again
+_CTX_CACHE_FILE = Path(__file__).parent / ".tmux_ctx_cache"
+_CTX_CACHE_TTL = 60  # seconds
 
-    lines = output.split("\n")
+# Notification queue: hooks firing within this window are coalesced into
+# a single POST so bursts don't trip Pushover's rate limits. The marker
+# file's mtime records the last successful POST, so a hook arriving
+# shortly after a send defers to a background flush instead of POSTing
+# again inside the window.
+_PENDING_FILE = Path(__file__).parent / "_pending_notifications.jsonl"
+_SENT_MARKER_FILE = Path(__file__).parent / ".pushover_last_sent"
+_COALESCE_WINDOW = 2.0  # seconds
 
-    # Get last N non-empty lines
-    relevant = []
-    for line in reversed(lines):
-        if line.strip():
-            relevant.insert(0, line)
-            if len(relevant) >= max_lines:
-                break
 
-    return "\n".join(relevant) if relevant else output
+def _read_cached_context(pane):
+    """Return (session, window) for pane from the cache file, if fresh."""
+    try:
+        if time.time() - _CTX_CACHE_FILE.stat().st_mtime > _CTX_CACHE_TTL:
+            return None
+        with open(_CTX_CACHE_FILE) as f:
+            cached_pane, session, window = f.read().split("\n")[:3]
+        if cached_pane == pane:
+            return session, window
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_cached_context(pane, session, window):
+    """Atomically write the pane's session/window to the cache file."""
+    tmp = _CTX_CACHE_FILE.with_suffix(".tmp")
+    try:
+        with open(tmp, "w") as f:
+            f.write(f"{pane}\n{session}\n{window}\n")
+        os.replace(tmp, _CTX_CACHE_FILE)
+    except OSError:
+        pass
 
 
-def send_pushover(config, message, title):
-    """Send Pushover notification."""
-    if not config["pushover"]["enabled"]:
-        print("Pushover notifications disabled in config")
-        return False
+def _warm_up_connection():
+    """Open the HTTPS connection to the Pushover API ahead of time."""
+    global _conn
+    try:
+        conn = http.client.HTTPSConnection(_API_HOST, timeout=10)
+        conn.connect()
+        _conn = conn
+    except Exception:
+        # Best effort - _post reconnects if the warmup failed
+        _conn = None
+
+
+def _post(path, body, headers):
+    """POST to the API host, retrying briefly on transient errors.
+
+    Returns (status code, response body as str). Reuses the connection
+    opened by the warmup thread when available.
+    """
+    global _conn
+    status, text = None, ""
+    for attempt in range(_RETRY_TOTAL + 1):
+        if attempt:
+            time.sleep(_RETRY_BACKOFF * (2 ** (attempt - 1)))
+        conn = _conn or http.client.HTTPSConnection(_API_HOST, timeout=10)
+        _conn = None
+        try:
+            conn.request("POST", path, body, headers)
+            resp = conn.getresponse()
+            status, text = resp.status, resp.read().decode("utf-8", "replace")
+        except Exception:
+            conn.close()
+            if attempt == _RETRY_TOTAL:
+                raise
+            continue
+        if status in _RETRY_STATUSES:
+            conn.close()
+            continue
+        # Keep the connection for a possible follow-up (e.g. --flush)
+        _conn = conn
+        return status, text
+    return status, text
+
+
+def get_tmux_snapshot(pane, num_lines=15, max_lines=10):
+    """Get session/window names and the pane output tail in one tmux call.
+
+    Chains display-message and capture-pane with tmux's ";" command
+    separator so one subprocess replaces separate metadata and capture
+    invocations; a sentinel line marks where the metadata ends. The
+    capture is streamed line by line into a bounded deque, so memory
+    stays O(max_lines) even when a wide wrapped pane returns far more
+    than num_lines lines. When the pane's session/window are cached
+    from a recent hook, only the capture-pane half runs.
+    """
+    cached = _read_cached_context(pane)
+    if cached:
+        session, window = cached
+        cmd = ["tmux", "capture-pane", "-p", "-t", pane, "-S", f"-{num_lines}"]
+        in_header = False
+    else:
+        session = window = None
+        cmd = [
+            "tmux",
+            "display-message", "-p", "-t", pane, f"#S\t#W\n{_SNAPSHOT_SEP}",
+            ";",
+            "capture-pane", "-p", "-t", pane, "-S", f"-{num_lines}",
+        ]
+        in_header = True
+
+    # Last max_lines non-empty, non-decorative lines of the capture.
+    # The pipe is read as bytes and decoded per line, which skips the
+    # TextIOWrapper universal-newlines machinery; stderr goes to DEVNULL
+    # since errors surface through the exit code anyway.
+    tail = deque(maxlen=max_lines)
+    try:
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
+        )
+        with proc.stdout:
+            for raw in proc.stdout:
+                line = raw.decode("utf-8", "replace").rstrip("\n")
+                if in_header:
+                    if line == _SNAPSHOT_SEP:
+                        in_header = False
+                    elif session is None:
+                        # Tab-separated; tabs can't appear in tmux
+                        # session/window names
+                        session, window = line.split("\t", 1)
+                    continue
+                line = _NONPRINT_RE.sub("", line)
+                stripped = line.strip()
+                if stripped and not _DECOR_CHARS.issuperset(stripped):
+                    tail.append(line)
+        if proc.wait() != 0 or session is None:
+            return None, None, None
+    except (OSError, ValueError):
+        return None, None, None
+
+    if not cached:
+        _write_cached_context(pane, session, window)
+
+    return session, window, "\n".join(tail)
 
-    url = "https://api.pushover.net/1/messages.json"
 
+def send_pushover(config, message, title, web_url):
+    """Send Pushover notification."""
     # Truncate message if too long (Pushover limit is 1024 chars)
     if len(message) > 900:
         message = message[-900:] + "\n[...truncated]"
 
-    # Use Tailscale host if configured, otherwise localhost
-    tailscale_host = config.get("tailscale_host", "").strip()
-    base_host = tailscale_host if tailscale_host else "localhost"
-
-    # Get current pane ID from environment
-    pane_id = os.environ.get("TMUX_PANE", "")
-
-    # Add pane parameter to URL for direct access to this specific instance
-    # URL-encode the pane ID since it contains % character
-    web_url = f"http://{base_host}:{config['server']['port']}?pane={quote(pane_id)}"
-
     data = {
         "token": config["pushover"]["app_token"],
         "user": config["pushover"]["user_key"],
@@ -111,27 +204,101 @@ def send_pushover(config, message, title):
     }
 
     try:
-        response = requests.post(url, data=data)
-        if response.status_code == 200:
+        status, text = _post(
+            "/1/messages.json",
+            urlencode(data),
+            {"Content-Type": "application/x-www-form-urlencoded"},
+        )
+        if status == 200:
             print(f"✓ Pushover notification sent: {title}")
             return True
         else:
-            print(f"✗ Pushover failed: {response.text}")
+            print(f"✗ Pushover failed: {text}")
             return False
     except Exception as e:
         print(f"✗ Error sending notification: {e}")
         return False
 
 
-def save_active_target(script_dir, pane, session, window):
-    """Save the active Claude pane to state file for web UI."""
-    state_file = script_dir / ".active_target"
+def queue_notification(title, message, web_url):
+    """Append a notification to the pending queue.
+
+    Returns the timestamp of the most recently queued prior entry, or
+    None if the queue was empty.
+    """
+    prev_ts = None
     try:
-        with open(state_file, "w") as f:
-            f.write(f"{pane}\n{session}\n{window}\n")
-        print(f"✓ Active target saved: {pane}")
-    except Exception as e:
-        print(f"Warning: Could not save active target: {e}")
+        if _PENDING_FILE.exists():
+            with open(_PENDING_FILE) as f:
+                lines = f.read().splitlines()
+            if lines:
+                prev_ts = json.loads(lines[-1]).get("ts")
+    except (OSError, ValueError):
+        prev_ts = None
+
+    try:
+        with open(_PENDING_FILE, "a") as f:
+            f.write(json.dumps({
+                "ts": time.time(),
+                "title": title,
+                "message": message,
+                "url": web_url,
+            }) + "\n")
+    except OSError as e:
+        print(f"Warning: Could not queue notification: {e}")
+
+    return prev_ts
+
+
+def _recently_sent():
+    """True if a POST went out within the coalesce window."""
+    try:
+        return time.time() - _SENT_MARKER_FILE.stat().st_mtime <= _COALESCE_WINDOW
+    except OSError:
+        return False
+
+
+def flush_notifications(config):
+    """Send everything in the pending queue as one coalesced POST."""
+    # Claim the whole queue atomically by renaming it away before
+    # reading: an entry appended mid-read can't be deleted unread the
+    # way it could with read-then-unlink, and a concurrent flush
+    # simply finds no file
+    claim = Path(f"{_PENDING_FILE}.{os.getpid()}.claim")
+    try:
+        os.replace(_PENDING_FILE, claim)
+    except OSError:
+        return False
+
+    try:
+        with open(claim) as f:
+            entries = [json.loads(line) for line in f if line.strip()]
+    except (OSError, ValueError):
+        entries = []
+    finally:
+        try:
+            os.unlink(claim)
+        except OSError:
+            pass
+
+    if not entries:
+        return False
+
+    title = entries[-1]["title"]
+    web_url = entries[-1].get("url", "")
+    if len(entries) == 1:
+        message = entries[-1]["message"]
+    else:
+        message = "\n---\n".join(e["message"] for e in entries)
+        title = f"{title} ({len(entries)} updates)"
+
+    sent = send_pushover(config, message, title, web_url)
+    if sent:
+        try:
+            _SENT_MARKER_FILE.touch()
+        except OSError:
+            pass
+    return sent
 
 
 def main():
@@ -141,41 +308,91 @@ def main():
     config_path = script_dir / "config.yaml"
 
     try:
-        config = load_config(config_path)
+        config = load_config_cached(config_path)
     except Exception as e:
         print(f"Error loading config: {e}")
         sys.exit(1)
 
-    # Get tmux context
-    session, window, pane = get_tmux_context()
+    # Bail out before any tmux or network work if notifications are off
+    if not config["pushover"]["enabled"]:
+        print("Pushover notifications disabled in config")
+        sys.exit(0)
+
+    # Start the TLS handshake in the background so it overlaps the tmux
+    # work below instead of sitting on the critical path
+    warmup = threading.Thread(target=_warm_up_connection, daemon=True)
+    warmup.start()
+
+    # Get tmux context and pane output in one shot
+    pane = os.environ.get("TMUX_PANE")
 
     if not pane:
         print("Not running in tmux - skipping notification")
         sys.exit(0)
 
-    # Save this as the active target for the web UI
-    save_active_target(script_dir, pane, session, window)
+    num_lines = config.get("context_lines", 15)
+    session, window, output = get_tmux_snapshot(pane, num_lines, max_lines=10)
+
+    if session is None:
+        print("Could not query tmux - skipping notification")
+        sys.exit(0)
+
+    # Save as the active target for the web UI and bump the instance
+    # history, in a single atomic state write
+    if update_state(pane, session, window):
+        print(f"✓ Active target saved: {pane}")
 
-    # Also save to instance history
-    save_claude_instance(pane, session, window)
+    # Build the web UI link once - the pane ID is constant for this run.
+    # URL-encode the pane ID since it contains % character
+    tailscale_host = config.get("tailscale_host", "").strip()
+    base_host = tailscale_host if tailscale_host else "localhost"
+    web_url = f"http://{base_host}:{config['server']['port']}?pane={quote(pane)}"
 
     # Build context title using tailscale host
-    tailscale_host = config.get("tailscale_host", "").strip()
     if not tailscale_host:
         # Fallback to session if tailscale_host not configured
         tailscale_host = session
     title = f"{tailscale_host}: {window}"
 
-    # Get tmux output
-    num_lines = config.get("context_lines", 15)
-    output = get_tmux_output(pane, num_lines)
+    # The snapshot already holds only the relevant tail lines
+    message = output or "Claude Code activity detected"
+
+    # Queue the notification; if another hook fired or a POST went out
+    # within the coalesce window, leave delivery to a backgrounded
+    # --flush run so the rest of the burst joins a single later POST
+    prev_ts = queue_notification(title, message, web_url)
+    if ((prev_ts is not None and time.time() - prev_ts <= _COALESCE_WINDOW)
+            or _recently_sent()):
+        subprocess.Popen(
+            [sys.executable, __file__, "--flush"],
+            start_new_session=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        print("✓ Notification queued for coalesced delivery")
+        return
+
+    # Send notification (wait for the warmed-up connection first)
+    warmup.join(timeout=5)
+    flush_notifications(config)
+
+
+def flush_main():
+    """Entry point for the backgrounded --flush run."""
+    # Wait out the coalesce window so the whole burst is in the queue
+    time.sleep(_COALESCE_WINDOW)
 
-    # Extract relevant context
-    message = extract_relevant_context(output, max_lines=10)
+    try:
+        config = load_config_cached(Path(__file__).parent / "config.yaml")
+    except Exception as e:
+        print(f"Error loading config: {e}")
+        sys.exit(1)
 
-    # Send notification
-    send_pushover(config, message, title)
+    flush_notifications(config)
 
 
 if __name__ == "__main__":
-    main()
+    if "--flush" in sys.argv[1:]:
+        flush_main()
+    else:
+        main()
@@ -7,112 +7,191 @@ with the actual Claude output from the tmux session.
 """
 
 import os
+import re
 import sys
-import requests
+import json
+import time
 import subprocess
+import threading
+import http.client
+from collections import deque
 from pathlib import Path
 from urllib.parse import quote
-from utils import load_config, strip_decorative_lines, save_claude_instance
+from utils import load_config_cached, update_state
 
 
-def get_tmux_context():
-    """Get the current tmux session and pane from environment."""
-    tmux_pane = os.environ.get("TMUX_PANE")
-    if not tmux_pane:
-        return None, None, None
+_API_HOST = "api.telegram.org"
+
+# Bounded retries so transient API errors can't block the hook for more
+# than a couple of seconds
+_RETRY_STATUSES = {429, 500, 502, 503, 504}
+_RETRY_TOTAL = 2
+_RETRY_BACKOFF = 0.2  # seconds, doubled per attempt
+
+# Connection opened by the warmup thread so the TLS handshake overlaps
+# the tmux work in main()
+_conn = None
+
+# Compiled once at import: the capture is cleaned on every hook
+_NONPRINT_RE = re.compile(r"[^\x20-\x7e\n\r\t]")  # keep ASCII printable + newlines/tabs
+# Decorative-only lines are detected per streamed line with a hashed
+# frozenset superset test - one C call, no regex state machine
+_DECOR_CHARS = frozenset(" \t-_=~*#")
+
+# Sentinel line separating metadata from pane output in get_tmux_snapshot()
+_SNAPSHOT_SEP = "---CLAUDE-REMOTE-UI-SEP---"
 
+# Session/window metadata cache: Claude fires Notification and Stop hooks
+# back-to-back in the same pane, so reuse a recent lookup instead of
+# asking tmux again
+_CTX_CACHE_FILE = Path(__file__).parent / ".tmux_ctx_cache"
+_CTX_CACHE_TTL = 60  # seconds
+
+
+def _read_cached_context(pane):
+    """Return (session, window) for pane from the cache file, if fresh."""
     try:
-        # Get session name
-        session = subprocess.run(
-            ["tmux", "display-message", "-p", "-t", tmux_pane, "#S"],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout.strip()
-
-        # Get window name
-        window = subprocess.run(
-            ["tmux", "display-message", "-p", "-t", tmux_pane, "#W"],
-            capture_output=True,
-            text=True,
-            check=True
-        ).stdout.strip()
-
-        return session, window, tmux_pane
-    except subprocess.CalledProcessError:
-        return None, None, None
+        if time.time() - _CTX_CACHE_FILE.stat().st_mtime > _CTX_CACHE_TTL:
+            return None
+        with open(_CTX_CACHE_FILE) as f:
+            cached_pane, session, window = f.read().split("\n")[:3]
+        if cached_pane == pane:
+            return session, window
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _write_cached_context(pane, session, window):
+    """Atomically write the pane's session/window to the cache file."""
+    tmp = _CTX_CACHE_FILE.with_suffix(".tmp")
+    try:
+        with open(tmp, "w") as f:
+            f.write(f"{pane}\n{session}\n{window}\n")
+        os.replace(tmp, _CTX_CACHE_FILE)
+    except OSError:
+        pass
 
 
-def get_tmux_output(pane, num_lines=15):
-    """Capture output from the specific tmux pane."""
+def _warm_up_connection():
+    """Open the HTTPS connection to the Telegram API ahead of time."""
+    global _conn
+    try:
+        conn = http.client.HTTPSConnection(_API_HOST, timeout=10)
+        conn.connect()
+        _conn = conn
+    except Exception:
+        # Best effort - _post reconnects if the warmup failed
+        _conn = None
+
+
+def _post(path, body, headers):
+    """POST to the API host, retrying briefly on transient errors.
+
+    Returns (status code, response body as str). Reuses the connection
+    opened by the warmup thread when available.
+    """
+    global _conn
+    status, text = None, ""
+    for attempt in range(_RETRY_TOTAL + 1):
+        if attempt:
+            time.sleep(_RETRY_BACKOFF * (2 ** (attempt - 1)))
+        conn = _conn or http.client.HTTPSConnection(_API_HOST, timeout=10)
+        _conn = None
+        try:
+            conn.request("POST", path, body, headers)
+            resp = conn.getresponse()
+            status, text = resp.status, resp.read().decode("utf-8", "replace")
+        except Exception:
+            conn.close()
+            if attempt == _RETRY_TOTAL:
+                raise
+            continue
+        if status in _RETRY_STATUSES:
+            conn.close()
+            continue
+        conn.close()
+        return status, text
+    return status, text
+
+
+def get_tmux_snapshot(pane, num_lines=15, max_lines=30):
+    """Get session/window names and the pane output tail in one tmux call.
+
+    Chains display-message and capture-pane with tmux's ";" command
+    separator so one subprocess replaces separate metadata and capture
+    invocations; a sentinel line marks where the metadata ends. The
+    capture is streamed line by line into a bounded deque, so memory
+    stays O(max_lines) even when a wide wrapped pane returns far more
+    than num_lines lines. When the pane's session/window are cached
+    from a recent hook, only the capture-pane half runs.
+    """
+    cached = _read_cached_context(pane)
+    if cached:
+        session, window = cached
+        cmd = ["tmux", "capture-pane", "-p", "-t", pane, "-S", f"-{num_lines}"]
+        in_header = False
+    else:
+        session = window = None
+        cmd = [
+            "tmux",
+            "display-message", "-p", "-t", pane, f"#S\t#W\n{_SNAPSHOT_SEP}",
+            ";",
+            "capture-pane", "-p", "-t", pane, "-S", f"-{num_lines}",
+        ]
+        in_header = True
+
+    # Last max_lines non-empty, non-decorative lines of the capture.
+    # The pipe is read as bytes and decoded per line, which skips the
+    # TextIOWrapper universal-newlines machinery; stderr goes to DEVNULL
+    # since errors surface through the exit code anyway.
+    tail = deque(maxlen=max_lines)
     try:
-        result = subprocess.run(
-            ["tmux", "capture-pane", "-p", "-t", pane, "-S", f"-{num_lines}"],
-            capture_output=True,
-            text=True,
-            check=True
+        proc = subprocess.Popen(
+            cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL
         )
-        # Strip decorative lines for cleaner notifications
-        return strip_decorative_lines(result.stdout).strip()
-    except subprocess.CalledProcessError:
-        return None
-
+        with proc.stdout:
+            for raw in proc.stdout:
+                line = raw.decode("utf-8", "replace").rstrip("\n")
+                if in_header:
+                    if line == _SNAPSHOT_SEP:
+                        in_header = False
+                    elif session is None:
+                        # Tab-separated; tabs can't appear in tmux
+                        # session/window names
+                        session, window = line.split("\t", 1)
+                    continue
+                line = _NONPRINT_RE.sub("", line)
+                stripped = line.strip()
+                if stripped and not _DECOR_CHARS.issuperset(stripped):
+                    tail.append(line)
+        if proc.wait() != 0 or session is None:
+            return None, None, None
+    except (OSError, ValueError):
+        return None, None, None
 
-def extract_relevant_context(output, max_lines=30):
-    """Extract the most relevant lines from tmux output."""
-    if not output:
-        return "Claude Code activity detected"
+    if not cached:
+        _write_cached_context(pane, session, window)
 
-    lines = output.split("\n")
+    return session, window, "\n".join(tail)
 
-    # Get last N non-empty lines
-    relevant = []
-    for line in reversed(lines):
-        if line.strip():
-            relevant.insert(0, line)
-            if len(relevant) >= max_lines:
-                break
 
-    return "\n".join(relevant) if relevant else output
+# Translation table for escape_html: one C-level pass instead of three
+# chained str.replace calls over the (multi-KB) message body
+_HTML_ESCAPE = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;'})
 
 
 def escape_html(text):
     """Escape special characters for Telegram HTML."""
-    text = text.replace('&', '&amp;')
-    text = text.replace('<', '&lt;')
-    text = text.replace('>', '&gt;')
-    return text
+    return text.translate(_HTML_ESCAPE)
 
 
-def send_telegram(config, message, title):
+def send_telegram(config, message, title, web_url):
     """Send Telegram notification via Bot API."""
     telegram_config = config.get("telegram", {})
-
-    if not telegram_config.get("enabled", False):
-        print("Telegram notifications disabled in config")
-        return False
-
     bot_token = telegram_config.get("bot_token", "")
     chat_id = telegram_config.get("chat_id", "")
 
-    if not bot_token or bot_token == "YOUR_TELEGRAM_BOT_TOKEN_HERE":
-        print("Telegram bot token not configured")
-        return False
-
-    if not chat_id or chat_id == "YOUR_TELEGRAM_CHAT_ID_HERE":
-        print("Telegram chat ID not configured")
-        return False
-
-    # Use Tailscale host if configured, otherwise localhost
-    tailscale_host = config.get("tailscale_host", "").strip()
-    base_host = tailscale_host if tailscale_host else "localhost"
-
-    # Get current pane ID from environment
-    pane_id = os.environ.get("TMUX_PANE", "")
-
-    # Add pane parameter to URL for direct access to this specific instance
-    web_url = f"http://{base_host}:{config['server']['port']}?pane={quote(pane_id)}"
-
     # Truncate message if too long (Telegram limit is 4096 chars)
     # Reserve space for title, URL, and formatting
     max_message_len = 3500
@@ -127,9 +206,6 @@ def send_telegram(config, message, title):
     escaped_title = escape_html(title)
     full_message = f"<b>{escaped_title}</b>\n\n<pre>{escaped_message}</pre>"
 
-    # Telegram API endpoint
-    api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-
     # Use inline keyboard button for the URL (works with any URL including local/Tailscale)
     payload = {
         "chat_id": chat_id,
@@ -144,8 +220,12 @@ def send_telegram(config, message, title):
     }
 
     try:
-        response = requests.post(api_url, json=payload)
-        result = response.json()
+        _, text = _post(
+            f"/bot{bot_token}/sendMessage",
+            json.dumps(payload),
+            {"Content-Type": "application/json"},
+        )
+        result = json.loads(text)
 
         if result.get("ok"):
             print(f"✓ Telegram notification sent: {title}")
@@ -158,17 +238,6 @@ def send_telegram(config, message, title):
         return False
 
 
-def save_active_target(script_dir, pane, session, window):
-    """Save the active Claude pane to state file for web UI."""
-    state_file = script_dir / ".active_target"
-    try:
-        with open(state_file, "w") as f:
-            f.write(f"{pane}\n{session}\n{window}\n")
-        print(f"✓ Active target saved: {pane}")
-    except Exception as e:
-        print(f"Warning: Could not save active target: {e}")
-
-
 def main():
     """Entry point for hook script."""
     # Load configuration
@@ -176,26 +245,61 @@ def main():
     config_path = script_dir / "config.yaml"
 
     try:
-        config = load_config(config_path)
+        config = load_config_cached(config_path)
     except Exception as e:
         print(f"Error loading config: {e}")
         sys.exit(1)
 
-    # Get tmux context
-    session, window, pane = get_tmux_context()
+    # Bail out before any tmux or network work if notifications are off
+    # or the bot isn't configured yet
+    telegram_config = config.get("telegram", {})
+
+    if not telegram_config.get("enabled", False):
+        print("Telegram notifications disabled in config")
+        sys.exit(0)
+
+    bot_token = telegram_config.get("bot_token", "")
+    chat_id = telegram_config.get("chat_id", "")
+
+    if not bot_token or bot_token == "YOUR_TELEGRAM_BOT_TOKEN_HERE":
+        print("Telegram bot token not configured")
+        sys.exit(0)
+
+    if not chat_id or chat_id == "YOUR_TELEGRAM_CHAT_ID_HERE":
+        print("Telegram chat ID not configured")
+        sys.exit(0)
+
+    # Start the TLS handshake in the background so it overlaps the tmux
+    # work below instead of sitting on the critical path
+    warmup = threading.Thread(target=_warm_up_connection, daemon=True)
+    warmup.start()
+
+    # Get tmux context and pane output in one shot
+    pane = os.environ.get("TMUX_PANE")
 
     if not pane:
         print("Not running in tmux - skipping notification")
         sys.exit(0)
 
-    # Save this as the active target for the web UI
-    save_active_target(script_dir, pane, session, window)
+    num_lines = config.get("context_lines", 50)
+    session, window, output = get_tmux_snapshot(pane, num_lines, max_lines=30)
 
-    # Also save to instance history
-    save_claude_instance(pane, session, window)
+    if session is None:
+        print("Could not query tmux - skipping notification")
+        sys.exit(0)
 
-    # Build context title using tailscale host (short name only)
+    # Save as the active target for the web UI and bump the instance
+    # history, in a single atomic state write
+    if update_state(pane, session, window):
+        print(f"✓ Active target saved: {pane}")
+
+    # Build the web UI link once - the pane ID is constant for this run.
+    # URL-encode the pane ID since it contains % character
     tailscale_host = config.get("tailscale_host", "").strip()
+    base_host = tailscale_host if tailscale_host else "localhost"
+    web_url = f"http://{base_host}:{config['server']['port']}?pane={quote(pane)}"
+
+    # Build context title using tailscale host (short name only)
     if not tailscale_host:
         # Fallback to session if tailscale_host not configured
         short_host = session
@@ -204,15 +308,12 @@ def main():
         short_host = tailscale_host.split('.')[0]
     title = f"{short_host}: {window}"
 
-    # Get tmux output
-    num_lines = config.get("context_lines", 50)
-    output = get_tmux_output(pane, num_lines)
-
-    # Extract relevant context
-    message = extract_relevant_context(output, max_lines=30)
+    # The snapshot already holds only the relevant tail lines
+    message = output or "Claude Code activity detected"
 
-    # Send notification
-    send_telegram(config, message, title)
+    # Send notification (wait for the warmed-up connection first)
+    warmup.join(timeout=5)
+    send_telegram(config, message, title, web_url)
 
 
 if __name__ == "__main__":
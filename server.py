@@ -9,9 +9,12 @@ from flask import Flask, render_template, request, jsonify
 from datetime import datetime
 from pathlib import Path
 import argparse
+import hashlib
+import time
 from utils import (
-    load_config, get_tmux_output, send_to_tmux, tmux_session_exists,
-    get_claude_instances, get_instance_info
+    load_config, get_tmux_output, get_tmux_activity, send_to_tmux,
+    tmux_session_exists, get_claude_instances, load_state,
+    save_active_target
 )
 
 
@@ -19,6 +22,34 @@ app = Flask(__name__)
 config = None
 script_dir = None
 
+# Instance discovery shells out to tmux; with the browser polling every
+# second, a short TTL keeps those subprocesses off the per-request path
+_instances_cache = {"ts": 0.0, "value": None}
+_INSTANCES_TTL = 1.0  # seconds
+
+
+def cached_instances():
+    """Return get_claude_instances() memoized behind a short TTL."""
+    now = time.monotonic()
+    if (_instances_cache["value"] is None
+            or now - _instances_cache["ts"] >= _INSTANCES_TTL):
+        _instances_cache["value"] = get_claude_instances()
+        _instances_cache["ts"] = now
+    return _instances_cache["value"]
+
+
+def cached_instance_info(pane):
+    """Look up a pane in the cached instance list."""
+    for instance in cached_instances():
+        if instance.get("pane") == pane:
+            return instance
+    return None
+
+
+# Differential capture state for /api/output: the full capture-pane only
+# runs when the pane's change marker has moved
+_pane_snapshots = {}  # pane -> (activity marker, cached output)
+
 
 @app.after_request
 def add_no_cache_headers(response):
@@ -40,7 +71,7 @@ def get_active_target(pane_override=None):
     """
     # If pane is provided via URL parameter, use it directly
     if pane_override:
-        info = get_instance_info(pane_override)
+        info = cached_instance_info(pane_override)
         if info:
             return info["pane"], info["session"], info["window"]
         # If not in history but exists, try to use it anyway
@@ -48,33 +79,22 @@ def get_active_target(pane_override=None):
             return pane_override, "unknown", "unknown"
         return None, None, None
 
-    # Otherwise read from state file (default behavior)
-    state_file = script_dir / ".active_target"
-    if not state_file.exists():
-        return None, None, None
-
-    try:
-        with open(state_file) as f:
-            lines = f.read().strip().split("\n")
-            if len(lines) >= 3:
-                return lines[0], lines[1], lines[2]  # pane, session, window
-            elif len(lines) >= 1:
-                return lines[0], "unknown", "unknown"
-    except Exception:
-        pass
-
+    # Otherwise read from the shared state file (default behavior);
+    # load_state caches the parsed file on its mtime, so this is a
+    # single stat() when nothing has changed since the last request
+    active = load_state().get("active") or {}
+    if active.get("pane"):
+        return (
+            active["pane"],
+            active.get("session", "unknown"),
+            active.get("window", "unknown"),
+        )
     return None, None, None
 
 
 def set_active_target(pane, session, window):
-    """Set the active Claude target in state file."""
-    state_file = script_dir / ".active_target"
-    try:
-        with open(state_file, "w") as f:
-            f.write(f"{pane}\n{session}\n{window}\n")
-        return True
-    except Exception:
-        return False
+    """Set the active Claude target in the shared state file."""
+    return save_active_target(pane, session, window)
 
 
 @app.route("/")
@@ -85,7 +105,7 @@ def index():
     pane, session, window = get_active_target(pane_param)
 
     # Get list of available instances
-    instances = get_claude_instances()
+    instances = cached_instances()
 
     # If no pane selected but instances available, auto-select the first one
     if not pane and instances:
@@ -140,14 +160,41 @@ def get_output():
             "active": False
         })
 
-    if not tmux_session_exists(pane):
+    # The activity probe doubles as the existence check: it fails when
+    # the pane is gone
+    marker = get_tmux_activity(pane)
+    if marker is None:
         return jsonify({
             "output": f"Target {pane} is no longer active.",
             "active": False
         })
 
-    output = get_tmux_output(pane, num_lines=50)
-    return jsonify({"output": output or "", "active": True, "pane": pane})
+    cached = _pane_snapshots.get(pane)
+    if cached and cached[0] == marker:
+        return _output_response(cached[1], pane, unchanged=True)
+
+    output = get_tmux_output(pane, num_lines=50) or ""
+    _pane_snapshots[pane] = (marker, output)
+    return _output_response(output, pane)
+
+
+def _output_response(output, pane, unchanged=False):
+    """Build the /api/output response, honoring If-None-Match.
+
+    A short blake2b digest of the content serves as the ETag, so a
+    polling client that already holds the current output gets a
+    ~200-byte 304 instead of the full multi-KB body.
+    """
+    etag = hashlib.blake2b(output.encode(), digest_size=8).hexdigest()
+    if request.headers.get("If-None-Match") == etag:
+        return "", 304
+
+    payload = {"output": output, "active": True, "pane": pane}
+    if unchanged:
+        payload["unchanged"] = True
+    resp = jsonify(payload)
+    resp.headers["ETag"] = etag
+    return resp
 
 
 @app.route("/api/send", methods=["POST"])
@@ -179,7 +226,7 @@ def send_input():
 @app.route("/api/instances")
 def list_instances():
     """API endpoint to list available Claude instances."""
-    instances = get_claude_instances()
+    instances = cached_instances()
     pane_param = request.args.get("pane")
     current_pane, _, _ = get_active_target(pane_param)
 
@@ -199,7 +246,7 @@ def switch_instance():
         return jsonify({"error": "No pane provided"}), 400
 
     # Verify instance exists
-    info = get_instance_info(pane)
+    info = cached_instance_info(pane)
     if not info:
         return jsonify({"error": "Instance not found"}), 404
 
@@ -264,11 +311,19 @@ def main():
 
     print("-" * 60)
 
-    app.run(
-        host=host,
-        port=port,
-        debug=False
-    )
+    try:
+        # Production WSGI server: a thread pool overlaps the tmux
+        # subprocess latency across polling clients, where the
+        # single-threaded dev server serializes every request
+        from waitress import serve
+        serve(app, host=host, port=port, threads=8)
+    except ImportError:
+        print("waitress not installed - falling back to Flask dev server")
+        app.run(
+            host=host,
+            port=port,
+            debug=False
+        )
 
 
 if __name__ == "__main__":
@@ -5,39 +5,49 @@ Telegram Bot Listener for Claude Remote UI
 Polls for incoming Telegram messages and sends them to the active Claude tmux pane.
 """
 
-import time
+import asyncio
+import json
+import random
+import secrets
 import subprocess
-import requests
+import aiohttp
+from aiohttp import web
 from pathlib import Path
-from utils import load_config, send_to_tmux, tmux_session_exists, get_claude_instances, save_claude_instance
+from urllib.parse import urlparse
+from utils import (
+    load_config_cached, send_to_tmux, tmux_live_panes,
+    get_claude_instances, save_claude_instance, load_state,
+    save_active_target
+)
 
 
-def get_active_target(script_dir):
-    """Get the active Claude pane from state file."""
-    state_file = script_dir / ".active_target"
-    try:
-        if state_file.exists():
-            with open(state_file, "r") as f:
-                lines = f.read().strip().split("\n")
-                if lines:
-                    return lines[0]  # pane ID
-    except Exception:
-        pass
-    return None
+# Caps concurrent sendMessage calls at Telegram's bot-wide 30 msg/s
+# limit; created in main() once the event loop exists
+_send_sem = None
 
+HELP_TEXT = """<b>Commands:</b>
+/status - Show active Claude session
+/list - List all Claude sessions
+/switch N - Switch to session N
+/new [name] - Spawn new Claude instance
+/help - Show this help
+
+<b>Usage:</b>
+Just type any message to send it to the active Claude session."""
+
+
+def get_active_target():
+    """Get the active Claude pane from the shared state file."""
+    active = load_state().get("active") or {}
+    return active.get("pane") or None
 
-def set_active_target(script_dir, pane, session, window):
-    """Set the active Claude pane in state file."""
-    state_file = script_dir / ".active_target"
-    try:
-        with open(state_file, "w") as f:
-            f.write(f"{pane}\n{session}\n{window}\n")
-        return True
-    except Exception:
-        return False
 
+def set_active_target(pane, session, window):
+    """Set the active Claude pane in the shared state file."""
+    return save_active_target(pane, session, window)
 
-def spawn_claude_instance(script_dir, window_name="TGClaude"):
+
+def spawn_claude_instance(window_name="TGClaude"):
     """Spawn a new Claude instance in a new tmux window."""
     try:
         # Get existing tmux sessions
@@ -47,10 +57,17 @@ def spawn_claude_instance(script_dir, window_name="TGClaude"):
             text=True
         )
 
+        # -P -F prints the new pane's ID directly, so there is no
+        # follow-up list-panes lookup against the session:window name -
+        # everything after this targets the pane by ID, which tmux
+        # resolves without a name search
         if result.returncode != 0:
             # No tmux server running, create new session
-            subprocess.run(
-                ["tmux", "new-session", "-d", "-s", "claude", "-n", window_name],
+            result = subprocess.run(
+                ["tmux", "new-session", "-d", "-s", "claude", "-n", window_name,
+                 "-P", "-F", "#{pane_id}"],
+                capture_output=True,
+                text=True,
                 check=True
             )
             session = "claude"
@@ -60,29 +77,27 @@ def spawn_claude_instance(script_dir, window_name="TGClaude"):
             session = sessions[0] if sessions else "claude"
 
             # Create new window in that session
-            subprocess.run(
-                ["tmux", "new-window", "-t", session, "-n", window_name],
+            result = subprocess.run(
+                ["tmux", "new-window", "-t", session, "-n", window_name,
+                 "-P", "-F", "#{pane_id}"],
+                capture_output=True,
+                text=True,
                 check=True
             )
 
-        # Get the pane ID of the new window
-        result = subprocess.run(
-            ["tmux", "list-panes", "-t", f"{session}:{window_name}", "-F", "#{pane_id}"],
-            capture_output=True,
-            text=True,
-            check=True
-        )
         pane_id = result.stdout.strip()
 
-        # Send the claude command to the new pane
+        # Send the claude command to the new pane; output is unused
         subprocess.run(
             ["tmux", "send-keys", "-t", pane_id, "claude --dangerously-skip-permissions", "Enter"],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             check=True
         )
 
         # Save as active instance
         save_claude_instance(pane_id, session, window_name)
-        set_active_target(script_dir, pane_id, session, window_name)
+        set_active_target(pane_id, session, window_name)
 
         return pane_id, session, window_name
 
@@ -94,9 +109,8 @@ def spawn_claude_instance(script_dir, window_name="TGClaude"):
         return None, None, None
 
 
-def send_telegram_message(bot_token, chat_id, text, reply_to_message_id=None):
+async def send_telegram_message(session, api_base, chat_id, text, reply_to_message_id=None):
     """Send a message back to Telegram."""
-    api_url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
     payload = {
         "chat_id": chat_id,
         "text": text,
@@ -106,38 +120,341 @@ def send_telegram_message(bot_token, chat_id, text, reply_to_message_id=None):
         payload["reply_to_message_id"] = reply_to_message_id
 
     try:
-        requests.post(api_url, json=payload, timeout=10)
+        async with _send_sem:
+            async with session.post(
+                f"{api_base}/sendMessage", json=payload,
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as resp:
+                await resp.read()
     except Exception as e:
         print(f"Error sending Telegram message: {e}")
 
 
-def get_updates(bot_token, offset=None, timeout=30):
-    """Get updates from Telegram using long polling."""
-    api_url = f"https://api.telegram.org/bot{bot_token}/getUpdates"
-    params = {
-        "timeout": timeout,
-        "allowed_updates": ["message"]
-    }
-    if offset:
-        params["offset"] = offset
+async def get_updates(session, url, timeout=30):
+    """Get updates from Telegram using long polling.
+
+    url is the fully formed getUpdates request (see run_polling);
+    timeout must match its timeout= parameter, which keeps the request
+    parked server-side for up to 30s. Telegram handles longer values
+    unreliably (>60 is rejected or silently clamped), so don't raise
+    it further. Network errors propagate so the caller can back off.
+    """
+    async with session.get(
+        url, timeout=aiohttp.ClientTimeout(total=timeout + 10)
+    ) as resp:
+        result = await resp.json()
+    if result.get("ok"):
+        return result.get("result", [])
+    return []
+
+
+async def _reply(ctx, text, message_id):
+    """Reply to a message in the configured chat."""
+    await send_telegram_message(
+        ctx["session"], ctx["api_base"], ctx["chat_id"], text, message_id
+    )
+
+
+async def handle_status(ctx, text, message_id):
+    """/status - show the active Claude session."""
+    pane = get_active_target()
+    if pane and pane in tmux_live_panes():
+        # Find display name from instances
+        instances = get_claude_instances()
+        display = pane
+        for inst in instances:
+            if inst.get("pane") == pane:
+                display = f"{inst.get('display_name')} ({pane})"
+                break
+        await _reply(ctx, f"Active: <code>{display}</code>", message_id)
+    else:
+        await _reply(ctx, "No active Claude session", message_id)
+
+
+async def handle_list(ctx, text, message_id):
+    """/list, /panes - list known Claude sessions."""
+    instances = get_claude_instances()
+    if not instances:
+        await _reply(ctx, "No Claude sessions found", message_id)
+        return
+
+    current_pane = get_active_target()
+    lines = ["<b>Claude Sessions:</b>\n"]
+    for i, inst in enumerate(instances, 1):
+        pane = inst.get("pane", "")
+        name = inst.get("display_name", pane)
+        marker = " ✓" if pane == current_pane else ""
+        lines.append(f"{i}. <code>{name}</code>{marker}")
+    lines.append(f"\nUse /switch N to change")
+    await _reply(ctx, "\n".join(lines), message_id)
+
+
+async def handle_switch(ctx, text, message_id):
+    """/switch N - make session N the active target."""
+    parts = text.split()
+    if len(parts) != 2:
+        await _reply(ctx, "Usage: /switch N (e.g., /switch 1)", message_id)
+        return
+
+    try:
+        idx = int(parts[1]) - 1
+    except ValueError:
+        await _reply(ctx, "Usage: /switch N (e.g., /switch 1)", message_id)
+        return
+
+    instances = get_claude_instances()
+    if not 0 <= idx < len(instances):
+        await _reply(
+            ctx,
+            f"Invalid number. Use /list to see available sessions.",
+            message_id
+        )
+        return
+
+    inst = instances[idx]
+    pane = inst.get("pane")
+    session_name = inst.get("session", "")
+    window = inst.get("window", "")
+    if pane in tmux_live_panes():
+        set_active_target(pane, session_name, window)
+        await _reply(
+            ctx,
+            f"Switched to <code>{inst.get('display_name')}</code>",
+            message_id
+        )
+    else:
+        await _reply(ctx, f"Session no longer exists", message_id)
+
+
+async def handle_new(ctx, text, message_id):
+    """/new [name] - spawn a fresh Claude instance."""
+    # Parse optional window name
+    parts = text.split(maxsplit=1)
+    window_name = parts[1] if len(parts) > 1 else "TGClaude"
 
+    await _reply(ctx, f"Spawning new Claude instance...", message_id)
+
+    pane_id, session_name, window = spawn_claude_instance(window_name)
+
+    if pane_id:
+        await _reply(
+            ctx,
+            f"Started <code>{session_name}:{window}</code>\nNow active. Send your prompt!",
+            message_id
+        )
+    else:
+        await _reply(
+            ctx, "Failed to spawn Claude instance. Check logs.", message_id
+        )
+
+
+async def handle_help(ctx, text, message_id):
+    """/help - reply with the precomputed command list."""
+    if message_id is None:
+        await _reply(ctx, HELP_TEXT, message_id)
+        return
+
+    # The body was fully serialized at startup; only the reply id
+    # varies, so one bytes % fills it in with no per-call json.dumps
+    body = ctx["help_body"] % message_id
     try:
-        response = requests.get(api_url, params=params, timeout=timeout + 10)
-        result = response.json()
-        if result.get("ok"):
-            return result.get("result", [])
+        async with _send_sem:
+            async with ctx["session"].post(
+                f"{ctx['api_base']}/sendMessage", data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as resp:
+                await resp.read()
     except Exception as e:
-        print(f"Error getting updates: {e}")
-    return []
+        print(f"Error sending Telegram message: {e}")
+
+
+# O(1) hashed dispatch for exact commands, plus a small prefix table
+# for the two commands that carry arguments
+EXACT_COMMANDS = {
+    "/status": handle_status,
+    "/list": handle_list,
+    "/panes": handle_list,
+    "/help": handle_help,
+}
+PREFIX_COMMANDS = (
+    ("/switch", handle_switch),
+    ("/new", handle_new),
+)
+
+
+async def handle_update(ctx, update):
+    """Process one incoming update: commands or text for the active pane."""
+    message = update.get("message", {})
+
+    # Only process messages from the configured chat - checked before
+    # any other field is touched, so updates from foreign chats (e.g.
+    # the bot added to a group) cost no further parsing. Telegram
+    # sends the id as an integer; ctx carries it pre-converted.
+    chat = message.get("chat") or {}
+    if chat.get("id") != ctx["chat_id_int"]:
+        return
+
+    text = message.get("text", "")
+    message_id = message.get("message_id")
+
+    # Handle commands (start with /)
+    if text.startswith("/"):
+        handler = EXACT_COMMANDS.get(text)
+        if handler is None:
+            for prefix, fn in PREFIX_COMMANDS:
+                if text.startswith(prefix):
+                    handler = fn
+                    break
+        if handler:
+            await handler(ctx, text, message_id)
+        return
+
+    if not text:
+        return
 
+    # Get active pane
+    pane = get_active_target()
 
-def main():
+    if not pane:
+        await _reply(
+            ctx,
+            "No active Claude session. Wait for a notification first.",
+            message_id
+        )
+        return
+
+    if pane not in tmux_live_panes():
+        await _reply(
+            ctx, f"Session <code>{pane}</code> no longer exists.", message_id
+        )
+        return
+
+    # Send to tmux
+    success = send_to_tmux(pane, text)
+
+    if success:
+        await _reply(ctx, f"Sent to Claude", message_id)
+    else:
+        await _reply(ctx, "Failed to send to Claude", message_id)
+
+
+async def run_polling(ctx):
+    """Fetch updates with getUpdates long polling."""
+    session = ctx["session"]
+    api_base = ctx["api_base"]
+    offset = None
+
+    # Query string built once: only the offset varies per poll, and an
+    # explicit offset (0 at startup) keeps the server from replaying
+    # updates already acknowledged with a higher one
+    updates_base = (
+        f"{api_base}/getUpdates"
+        "?timeout=30&allowed_updates=%5B%22message%22%5D&offset="
+    )
+
+    # A leftover webhook registration blocks getUpdates; clear it
+    try:
+        async with session.post(
+            f"{api_base}/deleteWebhook",
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as resp:
+            await resp.read()
+    except Exception:
+        pass
+
+    backoff = 1.0
+
+    while True:
+        try:
+            # No sleep between rounds: an empty batch just means the
+            # long poll timed out server-side, so re-park immediately
+            updates = await get_updates(session, f"{updates_base}{offset or 0}")
+
+            for update in updates:
+                offset = update["update_id"] + 1
+
+                # Replies run as tasks so a slow sendMessage never
+                # delays the next getUpdates round-trip
+                asyncio.create_task(handle_update(ctx, update))
+
+            backoff = 1.0
+
+        except Exception as e:
+            print(f"Error in main loop: {e}")
+            # Exponential backoff with jitter: a transient blip costs
+            # ~1s instead of a flat 5s, while a real outage backs off
+            # to 30s without synchronizing retries with other clients
+            await asyncio.sleep(backoff + random.uniform(0, backoff / 2))
+            backoff = min(backoff * 2, 30)
+
+
+async def run_webhook(ctx, webhook_url, telegram_config):
+    """Receive updates pushed by Telegram instead of long polling.
+
+    Cuts the outbound poll every 30s and one network leg of latency;
+    requires webhook_url to be reachable from Telegram (HTTPS, e.g.
+    behind a reverse proxy or tunnel).
+    """
+    # Fresh secret per run: Telegram echoes it in a header on every
+    # delivery, so spoofed posts are rejected before any JSON parse
+    secret = secrets.token_urlsafe(32)
+
+    try:
+        async with ctx["session"].post(
+            f"{ctx['api_base']}/setWebhook",
+            json={
+                "url": webhook_url,
+                "secret_token": secret,
+                "allowed_updates": ["message"],
+            },
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as resp:
+            result = await resp.json()
+    except Exception as e:
+        result = {"description": str(e)}
+
+    if not result.get("ok"):
+        print(f"setWebhook failed: {result.get('description', 'unknown error')}")
+        print("Falling back to long polling")
+        await run_polling(ctx)
+        return
+
+    async def receive(request):
+        if request.headers.get("X-Telegram-Bot-Api-Secret-Token") != secret:
+            return web.Response(status=403)
+        update = await request.json()
+        asyncio.create_task(handle_update(ctx, update))
+        return web.Response()
+
+    app = web.Application()
+    # Telegram POSTs to the full webhook_url, so serve its path
+    # component - a pass-through proxy or tunnel delivers it unchanged
+    app.router.add_post(urlparse(webhook_url).path or "/", receive)
+
+    port = int(telegram_config.get("webhook_port", 8443))
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "0.0.0.0", port)
+    await site.start()
+    print(f"Webhook mode: listening on port {port} for {webhook_url}")
+
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await runner.cleanup()
+
+
+async def main():
     """Main loop for Telegram listener."""
+    global _send_sem
+
     script_dir = Path(__file__).parent
     config_path = script_dir / "config.yaml"
 
     try:
-        config = load_config(config_path)
+        config = load_config_cached(config_path)
     except Exception as e:
         print(f"Error loading config: {e}")
         return
@@ -156,203 +473,44 @@ def main():
 
     print(f"Starting Telegram listener for chat_id: {chat_id}")
 
-    offset = None
-
-    while True:
-        try:
-            updates = get_updates(bot_token, offset)
-
-            for update in updates:
-                offset = update["update_id"] + 1
-
-                message = update.get("message", {})
-                msg_chat_id = str(message.get("chat", {}).get("id", ""))
-                text = message.get("text", "")
-                message_id = message.get("message_id")
-
-                # Only process messages from the configured chat
-                if msg_chat_id != chat_id:
-                    continue
-
-                # Handle commands (start with /)
-                if text.startswith("/"):
-                    if text == "/status":
-                        pane = get_active_target(script_dir)
-                        if pane and tmux_session_exists(pane):
-                            # Find display name from instances
-                            instances = get_claude_instances()
-                            display = pane
-                            for inst in instances:
-                                if inst.get("pane") == pane:
-                                    display = f"{inst.get('display_name')} ({pane})"
-                                    break
-                            send_telegram_message(
-                                bot_token, chat_id,
-                                f"Active: <code>{display}</code>",
-                                message_id
-                            )
-                        else:
-                            send_telegram_message(
-                                bot_token, chat_id,
-                                "No active Claude session",
-                                message_id
-                            )
-
-                    elif text == "/list" or text == "/panes":
-                        instances = get_claude_instances()
-                        if not instances:
-                            send_telegram_message(
-                                bot_token, chat_id,
-                                "No Claude sessions found",
-                                message_id
-                            )
-                        else:
-                            current_pane = get_active_target(script_dir)
-                            lines = ["<b>Claude Sessions:</b>\n"]
-                            for i, inst in enumerate(instances, 1):
-                                pane = inst.get("pane", "")
-                                name = inst.get("display_name", pane)
-                                marker = " ✓" if pane == current_pane else ""
-                                lines.append(f"{i}. <code>{name}</code>{marker}")
-                            lines.append(f"\nUse /switch N to change")
-                            send_telegram_message(
-                                bot_token, chat_id,
-                                "\n".join(lines),
-                                message_id
-                            )
-
-                    elif text.startswith("/switch"):
-                        parts = text.split()
-                        if len(parts) != 2:
-                            send_telegram_message(
-                                bot_token, chat_id,
-                                "Usage: /switch N (e.g., /switch 1)",
-                                message_id
-                            )
-                        else:
-                            try:
-                                idx = int(parts[1]) - 1
-                                instances = get_claude_instances()
-                                if 0 <= idx < len(instances):
-                                    inst = instances[idx]
-                                    pane = inst.get("pane")
-                                    session = inst.get("session", "")
-                                    window = inst.get("window", "")
-                                    if tmux_session_exists(pane):
-                                        set_active_target(script_dir, pane, session, window)
-                                        send_telegram_message(
-                                            bot_token, chat_id,
-                                            f"Switched to <code>{inst.get('display_name')}</code>",
-                                            message_id
-                                        )
-                                    else:
-                                        send_telegram_message(
-                                            bot_token, chat_id,
-                                            f"Session no longer exists",
-                                            message_id
-                                        )
-                                else:
-                                    send_telegram_message(
-                                        bot_token, chat_id,
-                                        f"Invalid number. Use /list to see available sessions.",
-                                        message_id
-                                    )
-                            except ValueError:
-                                send_telegram_message(
-                                    bot_token, chat_id,
-                                    "Usage: /switch N (e.g., /switch 1)",
-                                    message_id
-                                )
-
-                    elif text.startswith("/new"):
-                        # Parse optional window name
-                        parts = text.split(maxsplit=1)
-                        window_name = parts[1] if len(parts) > 1 else "TGClaude"
-
-                        send_telegram_message(
-                            bot_token, chat_id,
-                            f"Spawning new Claude instance...",
-                            message_id
-                        )
-
-                        pane_id, session, window = spawn_claude_instance(script_dir, window_name)
-
-                        if pane_id:
-                            send_telegram_message(
-                                bot_token, chat_id,
-                                f"Started <code>{session}:{window}</code>\nNow active. Send your prompt!",
-                                message_id
-                            )
-                        else:
-                            send_telegram_message(
-                                bot_token, chat_id,
-                                "Failed to spawn Claude instance. Check logs.",
-                                message_id
-                            )
-
-                    elif text == "/help":
-                        help_text = """<b>Commands:</b>
-/status - Show active Claude session
-/list - List all Claude sessions
-/switch N - Switch to session N
-/new [name] - Spawn new Claude instance
-/help - Show this help
-
-<b>Usage:</b>
-Just type any message to send it to the active Claude session."""
-                        send_telegram_message(
-                            bot_token, chat_id,
-                            help_text,
-                            message_id
-                        )
-
-                    continue
-
-                if not text:
-                    continue
-
-                # Get active pane
-                pane = get_active_target(script_dir)
-
-                if not pane:
-                    send_telegram_message(
-                        bot_token, chat_id,
-                        "No active Claude session. Wait for a notification first.",
-                        message_id
-                    )
-                    continue
-
-                if not tmux_session_exists(pane):
-                    send_telegram_message(
-                        bot_token, chat_id,
-                        f"Session <code>{pane}</code> no longer exists.",
-                        message_id
-                    )
-                    continue
-
-                # Send to tmux
-                success = send_to_tmux(pane, text)
-
-                if success:
-                    send_telegram_message(
-                        bot_token, chat_id,
-                        f"Sent to Claude",
-                        message_id
-                    )
-                else:
-                    send_telegram_message(
-                        bot_token, chat_id,
-                        "Failed to send to Claude",
-                        message_id
-                    )
-
-        except KeyboardInterrupt:
-            print("\nStopping Telegram listener...")
-            break
-        except Exception as e:
-            print(f"Error in main loop: {e}")
-            time.sleep(5)
+    _send_sem = asyncio.Semaphore(30)
+
+    # Built once: every API call shares the same token prefix
+    api_base = f"https://api.telegram.org/bot{bot_token}"
+
+    # One session for the life of the listener: the connector keeps a
+    # small pool of warm connections to api.telegram.org
+    connector = aiohttp.TCPConnector(limit=8, keepalive_timeout=60)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        # Shared handler context, built once per run
+        ctx = {
+            "session": session,
+            "api_base": api_base,
+            "chat_id": chat_id,
+            # Integer form for the per-update filter; a non-numeric
+            # configured id could never match Telegram's integer ids
+            # anyway, so None keeps the same reject-everything behavior
+            "chat_id_int": int(chat_id) if chat_id.lstrip("-").isdigit() else None,
+            # Static /help body, serialized once with a %d slot for
+            # the reply_to_message_id
+            "help_body": (
+                json.dumps({
+                    "chat_id": chat_id,
+                    "text": HELP_TEXT,
+                    "parse_mode": "HTML",
+                })[:-1] + ', "reply_to_message_id": %d}'
+            ).encode(),
+        }
+
+        webhook_url = telegram_config.get("webhook_url", "")
+        if webhook_url:
+            await run_webhook(ctx, webhook_url, telegram_config)
+        else:
+            await run_polling(ctx)
 
 
 if __name__ == "__main__":
-    main()
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        print("\nStopping Telegram listener...")
@@ -1,6 +1,9 @@
 """Shared utilities for Claude Remote UI."""
 
-import yaml
+import os
+import re
+import time
+import pickle
 import subprocess
 import json
 from pathlib import Path
@@ -9,6 +12,10 @@ from datetime import datetime
 
 def load_config(config_path="config.yaml"):
     """Load configuration from YAML file."""
+    # Deferred: PyYAML is a heavyweight import, and the hooks normally
+    # hit the pickle cache in load_config_cached without needing it
+    import yaml
+
     config_file = Path(config_path)
 
     if not config_file.exists():
@@ -21,64 +28,121 @@ def load_config(config_path="config.yaml"):
         return yaml.safe_load(f)
 
 
+def load_config_cached(config_path="config.yaml"):
+    """Load configuration, using a pickle cache keyed on the YAML's mtime.
+
+    The notify hooks are short-lived and re-parse the config on every
+    Claude hook firing; unpickling the cached dict is far cheaper than a
+    PyYAML parse. The cache is rebuilt whenever config.yaml changes.
+    """
+    config_file = Path(config_path)
+    cache_file = Path(f"{config_path}.pkl")
+
+    try:
+        if cache_file.stat().st_mtime >= config_file.stat().st_mtime:
+            with open(cache_file, "rb") as f:
+                return pickle.load(f)
+    except (OSError, pickle.PickleError, EOFError):
+        pass
+
+    config = load_config(config_path)
+
+    # Refresh the cache atomically; best effort on read-only setups
+    try:
+        tmp = cache_file.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(config, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except OSError:
+        pass
+
+    return config
+
+
+# Compiled once at import rather than inside strip_decorative_lines,
+# which runs on every capture the web server and listener display:
+# keep ASCII printable + newlines/tabs, then drop whole lines made of
+# nothing but common decorative characters (blank lines survive, since
+# a match needs at least one decorative char)
+_NONPRINT_RE = re.compile(r"[^\x20-\x7e\n\r\t]")
+# \r counts as whitespace so CR/CRLF-terminated decorative lines are
+# still recognized ($ in MULTILINE only looks across \n)
+_DECOR_LINE_RE = re.compile(r"^[ \t\r]*[-_=~*#][-_=~*# \t\r]*$\n?", re.MULTILINE)
+# Union of both patterns, used as a cheap "anything to strip?" probe
+_DECOR_SCAN_RE = re.compile(
+    r"[^\x20-\x7e\n\r\t]|^[ \t\r]*[-_=~*#][-_=~*# \t\r]*$", re.MULTILINE
+)
+
+
 def strip_decorative_lines(text):
     """Strip box-drawing characters and decorative lines from text."""
-    import re
-
-    # First, remove problematic Unicode characters (powerline symbols, etc.)
-    # Keep only printable ASCII characters
-    text = re.sub(r'[^\x20-\x7e\n\r\t]', '', text)  # Keep only ASCII printable + newlines/tabs
-
-    # Remove lines that are purely decorative (box-drawing characters, dashes, etc.)
-    lines = text.split('\n')
-    filtered_lines = []
-
-    for line in lines:
-        # Skip lines that are only box-drawing characters, spaces, and common decorative chars
-        stripped = line.strip()
-        if not stripped:
-            filtered_lines.append(line)
-            continue
-
-        # Check if line is purely decorative (only dashes, equals, underscores, etc.)
-        is_decorative = all(
-            c in ' \t-_=~*#'
-            for c in stripped
-        )
-
-        if not is_decorative:
-            filtered_lines.append(line)
+    # Fast path: plain ASCII output with no decorative lines is the
+    # common case, and one short-circuiting scan proves there is
+    # nothing to strip
+    if _DECOR_SCAN_RE.search(text) is None:
+        return text
 
-    return '\n'.join(filtered_lines)
+    # Two substitutions in the C regex engine replace the old split +
+    # per-character Python loop over every line
+    text = _NONPRINT_RE.sub("", text)
+    return _DECOR_LINE_RE.sub("", text)
 
 
 def get_tmux_output(target, num_lines=100):
     """Capture output from tmux target (session, window, or pane)."""
     try:
+        # Read bytes and decode once: cheaper than the universal-newlines
+        # wrapper. stderr goes to DEVNULL; errors surface via the exit code.
         result = subprocess.run(
             ["tmux", "capture-pane", "-p", "-t", target, "-S", f"-{num_lines}"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True
+        )
+        # Strip decorative lines for cleaner mobile display
+        return strip_decorative_lines(result.stdout.decode("utf-8", "replace"))
+    except subprocess.CalledProcessError:
+        return None
+
+
+def get_tmux_activity(target):
+    """Get a cheap change marker for a tmux pane.
+
+    Returns the pane's history size and session activity timestamp as an
+    opaque string, or None if the target is gone. Far cheaper than a
+    full capture-pane when nothing has changed.
+    """
+    try:
+        result = subprocess.run(
+            ["tmux", "display-message", "-p", "-t", target,
+             "#{history_size}|#{session_activity}"],
             capture_output=True,
             text=True,
             check=True
         )
-        # Strip decorative lines for cleaner mobile display
-        return strip_decorative_lines(result.stdout)
+        return result.stdout.strip()
     except subprocess.CalledProcessError:
         return None
 
 
 def send_to_tmux(target, text):
     """Send text input to tmux target (session, window, or pane)."""
+    # A message that is exactly ";" would itself be parsed as tmux's
+    # command separator and never reach the pane; "\\;" unescapes back
+    # to ";" during tmux's argument parsing, before -l applies
+    if text == ";":
+        text = "\\;"
+
     try:
-        # Send text literally, then send Enter key separately
-        # Using -l flag to send text literally (handles special characters)
+        # One invocation, chained with tmux's ";" command separator:
+        # the text goes literally (-l handles special characters), then
+        # Enter is sent as a key name. -l must not apply to "Enter", so
+        # the two stay separate send-keys commands.
         subprocess.run(
-            ["tmux", "send-keys", "-t", target, "-l", text],
-            check=True
-        )
-        # Now send the Enter key explicitly
-        subprocess.run(
-            ["tmux", "send-keys", "-t", target, "Enter"],
+            ["tmux",
+             "send-keys", "-t", target, "-l", text,
+             ";",
+             "send-keys", "-t", target, "Enter"],
             check=True
         )
         return True
@@ -89,10 +153,13 @@ def send_to_tmux(target, text):
 def tmux_session_exists(target):
     """Check if tmux target exists (session, window, or pane)."""
     try:
-        # Try to list the pane - works for sessions, windows, and panes
+        # Try to list the pane - works for sessions, windows, and panes.
+        # Only the exit code matters, so discard output without
+        # allocating pipes for it
         subprocess.run(
             ["tmux", "list-panes", "-t", target],
-            capture_output=True,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
             check=True
         )
         return True
@@ -100,26 +167,140 @@ def tmux_session_exists(target):
         return False
 
 
-def get_instance_history_file():
-    """Get path to instance history file."""
-    return Path(__file__).parent / ".claude_instances"
+# orjson is optional (not in requirements.txt) but noticeably faster
+# for the small dicts state.json holds; the wrappers keep both backends
+# behind the same bytes-in/bytes-out signatures
+try:
+    import orjson
 
+    def _json_loads(data):
+        return orjson.loads(data)
 
-def save_claude_instance(pane, session, window):
-    """Save Claude instance to history."""
-    history_file = get_instance_history_file()
+    def _json_dumps(obj):
+        return orjson.dumps(obj)
+except ImportError:
+    def _json_loads(data):
+        return json.loads(data)
+
+    def _json_dumps(obj):
+        return json.dumps(obj, separators=(",", ":")).encode()
+
+
+# Shared state file: active target plus instance history, written
+# atomically so readers never see a partial update
+STATE_FILE = Path(__file__).parent / "state.json"
+
+# Parsed state cache keyed on the file's mtime: writes go through
+# save_state's atomic rename, so an unchanged mtime always means an
+# unchanged file and the JSON re-parse can be skipped. This covers the
+# listener's per-message get_active_target as well as the web server's
+# per-request reads.
+_state_cache = {"mtime": None, "value": None}
+
+
+def load_state():
+    """Load the shared state file.
+
+    Returns a dict of shape {"active": {...} | None, "instances": [...]}
+    with instances ordered most recent first. Falls back to the legacy
+    .active_target / .claude_instances files from older versions.
+    """
+    try:
+        mtime = STATE_FILE.stat().st_mtime_ns
+    except OSError:
+        mtime = None
 
-    # Load existing history
+    if mtime is not None and mtime == _state_cache["mtime"]:
+        return _state_cache["value"]
+
+    try:
+        with open(STATE_FILE, "rb") as f:
+            state = _json_loads(f.read())
+        if isinstance(state, dict):
+            state.setdefault("active", None)
+            state.setdefault("instances", [])
+            if mtime is not None:
+                _state_cache["mtime"] = mtime
+                _state_cache["value"] = state
+            return state
+    except FileNotFoundError:
+        state = _load_legacy_state()
+        if state is not None:
+            return state
+    except (ValueError, OSError):
+        pass
+
+    return {"active": None, "instances": []}
+
+
+def _load_legacy_state():
+    """Read state from the pre-state.json files, if any exist."""
+    base = STATE_FILE.parent
+    active = None
     instances = []
-    if history_file.exists():
+    found = False
+
+    try:
+        # Read just the three lines the format defines rather than
+        # slurping and splitting the whole file
+        with open(base / ".active_target") as f:
+            pane = f.readline().strip()
+            session = f.readline().strip()
+            window = f.readline().strip()
+        if pane:
+            active = {
+                "pane": pane,
+                "session": session or "unknown",
+                "window": window or "unknown",
+            }
+        found = True
+    except OSError:
+        pass
+
+    try:
+        with open(base / ".claude_instances") as f:
+            instances = json.load(f)
+        found = True
+    except (OSError, json.JSONDecodeError):
+        pass
+
+    if not found:
+        return None
+    return {"active": active, "instances": instances}
+
+
+def save_state(state):
+    """Atomically write the shared state file."""
+    tmp = STATE_FILE.with_suffix(".json.tmp")
+    try:
+        with open(tmp, "wb") as f:
+            # Compact output: the file is machine-read, so skip the
+            # pretty-printing bytes and whitespace passes
+            f.write(_json_dumps(state))
+        os.replace(tmp, STATE_FILE)
+        # Seed the read cache with what was just written
         try:
-            with open(history_file) as f:
-                instances = json.load(f)
-        except (json.JSONDecodeError, Exception):
-            instances = []
+            _state_cache["mtime"] = STATE_FILE.stat().st_mtime_ns
+            _state_cache["value"] = state
+        except OSError:
+            _state_cache["mtime"] = None
+        return True
+    except OSError as e:
+        _state_cache["mtime"] = None
+        print(f"Warning: Could not save state: {e}")
+        return False
+
 
-    # Create instance entry
-    instance = {
+def save_active_target(pane, session, window):
+    """Set the active Claude target in the shared state file."""
+    state = load_state()
+    state["active"] = {"pane": pane, "session": session, "window": window}
+    return save_state(state)
+
+
+def _make_instance(pane, session, window):
+    """Build an instance-history entry."""
+    return {
         "pane": pane,
         "session": session,
         "window": window,
@@ -127,21 +308,37 @@ def save_claude_instance(pane, session, window):
         "display_name": f"{session}:{window}"
     }
 
-    # Remove duplicate if exists (same pane)
-    instances = [i for i in instances if i.get("pane") != pane]
 
-    # Add to front (most recent)
+def _upsert_instance(state, instance):
+    """Move instance to the front of the state's history, capped at 10."""
+    instances = [
+        i for i in state.get("instances", [])
+        if i.get("pane") != instance["pane"]
+    ]
     instances.insert(0, instance)
+    state["instances"] = instances[:10]
 
-    # Keep only last 10 instances
-    instances = instances[:10]
 
-    # Save
-    try:
-        with open(history_file, "w") as f:
-            json.dump(instances, f, indent=2)
-    except Exception as e:
-        print(f"Warning: Could not save instance history: {e}")
+def update_state(pane, session, window):
+    """Record pane as the active target and bump it in instance history.
+
+    One read and one atomic write replace the separate .active_target
+    and .claude_instances updates the hook path used to make.
+    """
+    state = load_state()
+    state["active"] = {"pane": pane, "session": session, "window": window}
+    _upsert_instance(state, _make_instance(pane, session, window))
+    return save_state(state)
+
+
+def save_claude_instance(pane, session, window):
+    """Save Claude instance to history."""
+    # The pane may have just been created; don't let a stale live-pane
+    # set hide it from get_claude_instances
+    _live_cache["ts"] = 0.0
+    state = load_state()
+    _upsert_instance(state, _make_instance(pane, session, window))
+    return save_state(state)
 
 
 def discover_claude_panes():
@@ -177,6 +374,37 @@ def discover_claude_panes():
         return []
 
 
+# Live-pane set cache: one list-panes call covers every instance
+# filtered in a burst of requests, instead of a subprocess per instance
+_live_cache = {"ts": 0.0, "value": None}
+_LIVE_TTL = 2.0  # seconds
+
+
+def tmux_live_panes():
+    """Return the set of pane IDs in the tmux server, cached briefly.
+
+    One list-panes fork covers any number of membership checks, so
+    callers handling a batch of messages should prefer
+    `pane in tmux_live_panes()` over per-pane tmux_session_exists
+    probes.
+    """
+    now = time.monotonic()
+    if (_live_cache["value"] is None
+            or now - _live_cache["ts"] >= _LIVE_TTL):
+        try:
+            result = subprocess.run(
+                ["tmux", "list-panes", "-a", "-F", "#{pane_id}"],
+                capture_output=True,
+                text=True,
+                check=True
+            )
+            _live_cache["value"] = set(result.stdout.split())
+        except subprocess.CalledProcessError:
+            _live_cache["value"] = set()
+        _live_cache["ts"] = now
+    return _live_cache["value"]
+
+
 def get_claude_instances():
     """Get list of Claude instances by discovering them from tmux."""
     # First, discover live Claude panes
@@ -186,26 +414,13 @@ def get_claude_instances():
     if live_instances:
         return live_instances
 
-    # Fallback to history file for backward compatibility
-    history_file = get_instance_history_file()
-
-    if not history_file.exists():
-        return []
-
-    try:
-        with open(history_file) as f:
-            instances = json.load(f)
-    except (json.JSONDecodeError, Exception):
-        return []
-
-    # Filter to only active instances
-    active_instances = []
-    for instance in instances:
-        pane = instance.get("pane")
-        if pane and tmux_session_exists(pane):
-            active_instances.append(instance)
-
-    return active_instances
+    # Fallback to saved history for backward compatibility, filtered
+    # against one batched pane listing rather than a probe per instance
+    live = tmux_live_panes()
+    return [
+        instance for instance in load_state().get("instances", [])
+        if instance.get("pane") in live
+    ]
 
 
 def get_instance_info(pane):